@@ -1,5 +1,15 @@
+from functools import cache
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
+# Share one parsed instance across all Streamlit sessions of the process,
+# fall back to a plain memo outside Streamlit
+try:
+    import streamlit as st
+    _settings_cache = st.cache_resource(show_spinner=False)
+except ImportError:
+    _settings_cache = cache
+
 # Class to manage environment variables
 class Settings(BaseSettings):
     ELEVENLABS_API_KEY: str
@@ -13,4 +23,14 @@ class Settings(BaseSettings):
         extra="ignore"
     )
 
-settings = Settings()
\ No newline at end of file
+# Parse .env once, on first use
+@_settings_cache
+def get_settings() -> Settings:
+    return Settings()
+
+# Proxy so `from core.config import settings` doesn't parse env at import time
+class LazySettings:
+    def __getattr__(self, name: str):
+        return getattr(get_settings(), name)
+
+settings = LazySettings()
@@ -2,10 +2,17 @@ import logging
 
 # File to manage logging (console level)
 
+# Skip per-record thread/process lookups and caller stack walks (funcName/lineno)
+logging.logThreads = False
+logging.logProcesses = False
+logging.logMultiprocessing = False
+logging._srcfile = None
+
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
-console_handler = logging.StreamHandler()
-console_handler.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(name)s - %(funcName)s - %(lineno)d - %(message)s"))
-
-logger.addHandler(console_handler)
\ No newline at end of file
+# Streamlit can re-import this module on reload, don't stack handlers
+if not logger.handlers:
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(name)s - %(message)s"))
+    logger.addHandler(console_handler)
@@ -4,25 +4,37 @@ Complete working version with Admin role support
 """
 
 import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import pathlib
-import uuid
+import secrets
+import itertools
+import importlib.util
+import hashlib
+import io
 import os
+import shutil
+import subprocess
 import zipfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Optional
-from datetime import datetime
 from supabase import create_client, Client
+from postgrest.exceptions import APIError
 
 # Import your project modules
 from core.config import settings
 from services.elevenlabs import ElevenLabsManager
+from services.tts_batch import count_uncached, generate_segments_parallel
 
-# Try importing pydub for audio merging
-try:
-    from pydub import AudioSegment
-    PYDUB_AVAILABLE = True
-except ImportError:
-    PYDUB_AVAILABLE = False
+# pydub is only needed for the merge fallback, so check for it without importing
+# (importing pulls in audioop and probes ffmpeg); it's imported on first use
+PYDUB_AVAILABLE = importlib.util.find_spec("pydub") is not None
+
+# ffmpeg lets us merge MP3s by stream copy, without decoding
+FFMPEG_PATH = shutil.which("ffmpeg")
 
 # ============================================================================
 # CONFIGURATION
@@ -30,16 +42,23 @@ except ImportError:
 
 SAMPLES_DIR = pathlib.Path("data/voicesamples")
 OUTPUTS_DIR = pathlib.Path("outputs/tts")
-SAMPLES_DIR.mkdir(parents=True, exist_ok=True)
-OUTPUTS_DIR.mkdir(parents=True, exist_ok=True)
+TTS_CACHE_DIR = OUTPUTS_DIR / ".cache"
 
-# Usage limits (for regular users)
+# Usage limits (for regular users). The voice limit is owned by the database
+# (max_voices_per_user()); this is only the fallback if it can't be read
 MAX_VOICES_PER_USER = 1
 MAX_GENERATIONS_PER_USER = 5
 
 # Admin role
 ADMIN_ROLE = "admin"
 
+# Segment worker threads (cache checks, copies, saves); the ElevenLabs requests
+# themselves are capped at TTS_POOL_CONCURRENCY in services/elevenlabs.py
+MAX_TTS_WORKERS = 8
+
+# Buffer size for streamed file copies (uploads, ZIP entries)
+COPY_CHUNK_SIZE = 1 << 20  # 1 MiB
+
 st.set_page_config(page_title="Multi-Speaker TTS", layout="wide", initial_sidebar_state="expanded")
 
 # ============================================================================
@@ -49,8 +68,8 @@ st.set_page_config(page_title="Multi-Speaker TTS", layout="wide", initial_sideba
 SUPABASE_URL = settings.SUPABASE_URL
 SUPABASE_KEY = settings.SUPABASE_ANON
 
-def get_supabase_client() -> Optional[Client]:
-    """Initialize and return Supabase client"""
+def _build_supabase_client() -> Optional[Client]:
+    """Initialize and return a new Supabase client"""
     if not SUPABASE_URL or not SUPABASE_KEY:
         return None
     try:
@@ -59,6 +78,31 @@ def get_supabase_client() -> Optional[Client]:
         st.error(f"Failed to connect to Supabase: {e}")
         return None
 
+@st.cache_resource(show_spinner=False)
+def get_supabase_client() -> Optional[Client]:
+    """Return the shared Supabase client (reused across reruns and sessions)"""
+    return _build_supabase_client()
+
+@st.cache_resource(show_spinner=False)
+def _prewarm_elevenlabs() -> bool:
+    """Warm the ElevenLabs connection pool once per process, off the render path"""
+    threading.Thread(target=ElevenLabsManager.prewarm, daemon=True).start()
+    return True
+
+@st.cache_resource(show_spinner=False)
+def _http_session() -> requests.Session:
+    """Return a pooled HTTP session for ElevenLabs REST calls"""
+    session = requests.Session()
+    session.headers["xi-api-key"] = settings.ELEVENLABS_API_KEY
+    session.mount("https://", HTTPAdapter(
+        pool_connections=10,
+        pool_maxsize=20,
+        # Only idempotent reads are retried: a DELETE retried after the server
+        # already acted on it comes back 404
+        max_retries=Retry(total=2, backoff_factor=0.3, status_forcelist=[502, 503, 504], allowed_methods=frozenset({"GET"}))
+    ))
+    return session
+
 # ============================================================================
 # ADMIN FUNCTIONS
 # ============================================================================
@@ -91,11 +135,20 @@ def is_admin(user_id: str) -> bool:
         st.session_state[cache_key] = False
         return False
 
+@st.cache_data(ttl=60, show_spinner=False)
+def get_max_voices_per_user() -> int:
+    """Voice limit enforced by the user_voices trigger, falling back to MAX_VOICES_PER_USER.
+    The fallback is cached too, so a missing RPC costs one call a minute, not one per render"""
+    try:
+        return int(get_supabase_client().rpc("max_voices_per_user").execute().data)
+    except Exception:
+        return MAX_VOICES_PER_USER
+
 def get_user_limits(user_id: str) -> tuple[int, int]:
     """Get voice and generation limits for user. Returns (voice_limit, generation_limit)"""
     if is_admin(user_id):
         return (999999, 999999)  # Unlimited for admins
-    return (MAX_VOICES_PER_USER, MAX_GENERATIONS_PER_USER)
+    return (get_max_voices_per_user(), MAX_GENERATIONS_PER_USER)
 
 # ============================================================================
 # DATABASE FUNCTIONS FOR USER VOICES
@@ -120,24 +173,25 @@ def save_user_voice(user_id: str, voice_id: str, voice_name: str) -> bool:
     if not supabase:
         return False
     
-    # Get user limits
-    max_voices, _ = get_user_limits(user_id)
-    
-    # Check if user has reached voice limit
-    voice_count = get_user_voice_count(user_id)
-    if voice_count >= max_voices:
-        st.error(f"❌ You can only create {max_voices} voice(s). Delete an existing voice to create a new one.")
-        return False
-    
+    # The voice limit is enforced by a trigger on user_voices, so no count pre-check here
     try:
         data = {
             "user_id": user_id,
             "voice_id": voice_id,
-            "voice_name": voice_name,
-            "created_at": datetime.utcnow().isoformat()
+            "voice_name": voice_name
         }
         supabase.table("user_voices").insert(data).execute()
+        _bump_usage("voices", 1)
+        if st.session_state.get("user_voices") is not None:
+            st.session_state.user_voices.append(data)
         return True
+    except APIError as e:
+        if e.code == "23514":  # check_violation raised by the voice limit trigger
+            max_voices, _ = get_user_limits(user_id)
+            st.error(f"❌ You can only create {max_voices} voice(s). Delete an existing voice to create a new one.")
+        else:
+            st.warning(f"Failed to save voice to database: {e}")
+        return False
     except Exception as e:
         st.warning(f"Failed to save voice to database: {e}")
         return False
@@ -163,6 +217,9 @@ def delete_user_voice(user_id: str, voice_id: str) -> bool:
     
     try:
         supabase.table("user_voices").delete().eq("user_id", user_id).eq("voice_id", voice_id).execute()
+        _bump_usage("voices", -1)
+        if st.session_state.get("user_voices") is not None:
+            st.session_state.user_voices = [v for v in st.session_state.user_voices if v.get("voice_id") != voice_id]
         return True
     except Exception as e:
         st.warning(f"Failed to delete voice: {e}")
@@ -185,21 +242,26 @@ def get_user_generation_count(user_id: str) -> int:
         st.warning(f"Failed to get generation count: {e}")
         return 0
 
-def save_tts_generation(user_id: str, text: str, voice_id: str, voice_name: str) -> bool:
-    """Save TTS generation record to database"""
+def build_tts_generation(user_id: str, text: str, voice_id: str, voice_name: str) -> Dict:
+    """Build a TTS generation record for insertion"""
+    return {
+        "user_id": user_id,
+        "text": text,
+        "voice_id": voice_id,
+        "voice_name": voice_name
+    }
+
+def save_tts_generations(rows: List[Dict]) -> bool:
+    """Save TTS generation records to database in a single insert"""
+    if not rows:
+        return True
+    
     supabase = get_supabase_client()
     if not supabase:
         return False
     
     try:
-        data = {
-            "user_id": user_id,
-            "text": text,
-            "voice_id": voice_id,
-            "voice_name": voice_name,
-            "created_at": datetime.utcnow().isoformat()
-        }
-        supabase.table("tts_generations").insert(data).execute()
+        supabase.table("tts_generations").insert(rows).execute()
         return True
     except Exception as e:
         st.warning(f"Failed to save generation: {e}")
@@ -218,13 +280,76 @@ def get_user_generations(user_id: str) -> List[Dict]:
         st.warning(f"Failed to fetch generations: {e}")
         return []
 
+# ============================================================================
+# DATABASE FUNCTIONS FOR USAGE
+# ============================================================================
+
+def get_user_usage(user_id: str) -> Dict[str, int]:
+    """Get voice and generation counts for user in one call. Returns {"voices": int, "gens": int}"""
+    supabase = get_supabase_client()
+    if not supabase:
+        return {"voices": 0, "gens": 0}
+    
+    try:
+        response = supabase.rpc("get_user_usage", {"uid": user_id}).execute()
+        data = response.data or {}
+        return {"voices": data.get("voices") or 0, "gens": data.get("gens") or 0}
+    except Exception:
+        # RPC not deployed yet - fall back to the individual count queries
+        return {"voices": get_user_voice_count(user_id), "gens": get_user_generation_count(user_id)}
+
+def get_user_dashboard(user_id: str) -> Dict:
+    """Get user's voices and usage counts in one call. Returns {"voices": list, "voice_count": int, "gens": int}"""
+    supabase = get_supabase_client()
+    if not supabase:
+        return {"voices": [], "voice_count": 0, "gens": 0}
+    
+    try:
+        response = supabase.rpc("get_user_dashboard", {"uid": user_id}).execute()
+        data = response.data or {}
+        return {
+            "voices": data.get("voices") or [],
+            "voice_count": data.get("voice_count") or 0,
+            "gens": data.get("gens") or 0
+        }
+    except Exception:
+        # RPC not deployed yet - fall back to separate queries
+        usage = get_user_usage(user_id)
+        return {"voices": get_user_voices(user_id), "voice_count": usage["voices"], "gens": usage["gens"]}
+
+def _load_dashboard(user_id: str):
+    """Populate session cache of user voices and usage counts from one dashboard call"""
+    dashboard = get_user_dashboard(user_id)
+    st.session_state.user_voices = dashboard["voices"]
+    st.session_state.usage = {"voices": dashboard["voice_count"], "gens": dashboard["gens"]}
+
+def _get_usage(user_id: str) -> Dict[str, int]:
+    """Get usage counts from session cache, fetching from database only on first access"""
+    if st.session_state.get("usage") is None:
+        _load_dashboard(user_id)
+    return st.session_state.usage
+
+def _get_user_voices(user_id: str) -> List[Dict]:
+    """Get user's voice records from session cache, fetching from database only on first access"""
+    if st.session_state.get("user_voices") is None:
+        _load_dashboard(user_id)
+    return st.session_state.user_voices
+
+def _bump_usage(field: str, delta: int):
+    """Adjust a cached usage counter locally after a successful write"""
+    usage = st.session_state.get("usage")
+    if usage is not None:
+        usage[field] = max(usage[field] + delta, 0)
+
 # ============================================================================
 # AUTHENTICATION FUNCTIONS
 # ============================================================================
 
 def login_user(email: str, password: str) -> bool:
     """Login user with email and password"""
-    supabase = get_supabase_client()
+    # Auth calls store the user session on the client, so they must not
+    # touch the shared cached client
+    supabase = _build_supabase_client()
     if not supabase:
         st.error("Database connection not configured")
         return False
@@ -271,7 +396,7 @@ def signup_user(email: str, password: str, confirm_password: str) -> bool:
         st.error("Password must be at least 6 characters")
         return False
     
-    supabase = get_supabase_client()
+    supabase = _build_supabase_client()
     if not supabase:
         st.error("Database connection not configured")
         return False
@@ -292,7 +417,7 @@ def signup_user(email: str, password: str, confirm_password: str) -> bool:
 
 def logout_user():
     """Logout current user"""
-    supabase = get_supabase_client()
+    supabase = _build_supabase_client()
     if supabase:
         try:
             supabase.auth.sign_out()
@@ -308,7 +433,11 @@ def logout_user():
     st.session_state.user = None
     st.session_state.segments = [create_new_segment()]
     st.session_state.last_generated_files = []
-    st.session_state.voices_cached = []
+    set_cached_voices([])
+    st.session_state.voices_loaded_version = None
+    st.session_state.usage = None
+    st.session_state.user_voices = None
+    st.session_state.clone_cache = {}
 
 def check_authentication():
     """Check if user is authenticated, show login page if not"""
@@ -367,8 +496,18 @@ SUPABASE_KEY=your_supabase_anon_key
 # SESSION STATE INITIALIZATION
 # ============================================================================
 
+@st.cache_resource(show_spinner=False)
+def _ensure_dirs() -> bool:
+    """Create data/output directories once per process (not on every rerun)"""
+    SAMPLES_DIR.mkdir(parents=True, exist_ok=True)
+    OUTPUTS_DIR.mkdir(parents=True, exist_ok=True)
+    TTS_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    return True
+
 def init_session_state():
     """Initialize all session state variables"""
+    _ensure_dirs()
+    _prewarm_elevenlabs()
     if "authenticated" not in st.session_state:
         st.session_state.authenticated = False
     if "user" not in st.session_state:
@@ -376,16 +515,48 @@ def init_session_state():
     if "segments" not in st.session_state:
         st.session_state.segments = [create_new_segment()]
     if "voices_cached" not in st.session_state:
-        st.session_state.voices_cached = []
+        set_cached_voices([])
+    if "voices_loaded_version" not in st.session_state:
+        st.session_state.voices_loaded_version = None
     if "last_generated_files" not in st.session_state:
         st.session_state.last_generated_files = []
     if "current_page" not in st.session_state:
         st.session_state.current_page = "editor"
+    if "usage" not in st.session_state:
+        st.session_state.usage = None
+    if "user_voices" not in st.session_state:
+        st.session_state.user_voices = None
+    if "clone_cache" not in st.session_state:
+        st.session_state.clone_cache = {}
+
+def _script_thread_pool(max_workers: int) -> ThreadPoolExecutor:
+    """Thread pool whose workers can use st.* calls (warnings, session state)"""
+    ctx = get_script_run_ctx()
+    return ThreadPoolExecutor(
+        max_workers=max_workers,
+        initializer=lambda: add_script_run_ctx(threading.current_thread(), ctx)
+    )
+
+def load_session_data(user_id: str):
+    """Load voice list and usage counts, overlapping the two requests on a cold session"""
+    need_voices = st.session_state.get("voices_loaded_version") != _voices_version()["value"]
+    need_usage = st.session_state.get("usage") is None
+    
+    if need_voices and need_usage:
+        with _script_thread_pool(2) as executor:
+            voices_future = executor.submit(fetch_voices)
+            usage_future = executor.submit(_get_usage, user_id)
+            voices_future.result()
+            usage_future.result()
+    elif need_voices:
+        fetch_voices()
+    elif need_usage:
+        _get_usage(user_id)
 
 def create_new_segment() -> Dict:
     """Create a new empty segment"""
     return {
-        "id": uuid.uuid4().hex,
+        "id": secrets.token_hex(16),
         "text": "",
         "voice_id": None,
         "voice_label": "Choose voice"
@@ -395,17 +566,36 @@ def create_new_segment() -> Dict:
 # VOICE MANAGEMENT
 # ============================================================================
 
+@st.cache_resource(show_spinner=False)
+def _voices_version() -> Dict:
+    """Process-wide voice list version, bumped whenever voices are created or deleted"""
+    return {"counter": itertools.count(1), "value": 0}
+
+def invalidate_voices():
+    """Mark the voice list stale; every session refetches it once on its next rerun"""
+    version = _voices_version()
+    version["value"] = next(version["counter"])
+
+@st.cache_data(ttl=300, show_spinner=False)
+def _fetch_voices_cached(api_key: str, url: str, version: int) -> List[Dict]:
+    """Fetch voice list from ElevenLabs API (cached per API key, URL and version for 5 minutes)"""
+    response = _http_session().get(url, timeout=8)
+    response.raise_for_status()
+    return response.json().get("voices", [])
+
+def set_cached_voices(voices: List[Dict]):
+    """Store voice list in session along with lookups derived from it once"""
+    st.session_state.voices_cached = voices
+    st.session_state.voices_by_id = {v.get("voice_id"): v for v in voices}
+    st.session_state.voice_options = [(v.get("name") or v.get("voice_id"), v.get("voice_id")) for v in voices]
+
 def fetch_voices() -> List[Dict]:
     """Fetch available voices from ElevenLabs API"""
+    version = _voices_version()["value"]
     try:
-        response = requests.get(
-            settings.ELEVENLABS_LIST_VOICES_URL,
-            headers={"xi-api-key": settings.ELEVENLABS_API_KEY},
-            timeout=8
-        )
-        response.raise_for_status()
-        voices = response.json().get("voices", [])
-        st.session_state.voices_cached = voices
+        voices = _fetch_voices_cached(settings.ELEVENLABS_API_KEY, settings.ELEVENLABS_LIST_VOICES_URL, version)
+        set_cached_voices(voices)
+        st.session_state.voices_loaded_version = version
         return voices
     except Exception as e:
         st.warning(f"Failed to fetch voices: {e}")
@@ -413,19 +603,23 @@ def fetch_voices() -> List[Dict]:
 
 def get_voice_options() -> List[tuple]:
     """Get voice options as (label, voice_id) tuples"""
-    voices = st.session_state.voices_cached
-    return [(v.get("name") or v.get("voice_id"), v.get("voice_id")) for v in voices]
+    return st.session_state.voice_options
 
 def delete_voice_from_elevenlabs(voice_id: str) -> bool:
     """Delete a voice from ElevenLabs"""
     try:
         delete_url = f"{settings.ELEVENLABS_LIST_VOICES_URL}/{voice_id}"
-        response = requests.delete(
-            delete_url,
-            headers={"xi-api-key": settings.ELEVENLABS_API_KEY},
-            timeout=8
-        )
-        response.raise_for_status()
+        response = _http_session().delete(delete_url, timeout=8)
+        # 404 means the voice is already gone, so the DB row can still be cleaned up
+        if response.status_code != 404:
+            response.raise_for_status()
+        invalidate_voices()
+        # Forget cloned samples pointing at the deleted voice
+        st.session_state.clone_cache = {
+            sample_hash: cached_id
+            for sample_hash, cached_id in st.session_state.clone_cache.items()
+            if cached_id != voice_id
+        }
         return True
     except Exception as e:
         st.error(f"Failed to delete voice from ElevenLabs: {e}")
@@ -443,24 +637,38 @@ def handle_voice_cloning(uploaded_file, voice_name: str):
     max_voices, _ = get_user_limits(user_id)
     
     # Check voice limit
-    voice_count = get_user_voice_count(user_id)
+    voice_count = _get_usage(user_id)["voices"]
     if voice_count >= max_voices and not is_admin(user_id):
         st.error(f"❌ You can only create {max_voices} voice(s). Delete an existing voice to create a new one.")
         return False
     
-    # Save uploaded file
+    # Save uploaded file, hashing it in the same pass
     try:
-        filename = f"{uuid.uuid4().hex}_{uploaded_file.name}"
+        filename = f"{secrets.token_hex(16)}_{uploaded_file.name}"
         file_path = str(SAMPLES_DIR / filename)
+        digest = hashlib.sha256()
+        # UploadedFile persists across reruns, so rewind in case it was read before
+        uploaded_file.seek(0)
         with open(file_path, "wb") as f:
-            f.write(uploaded_file.read())
-        st.success(f"✓ Saved: {filename}")
+            while chunk := uploaded_file.read(COPY_CHUNK_SIZE):
+                digest.update(chunk)
+                f.write(chunk)
+        sample_hash = digest.hexdigest()
     except Exception as e:
         st.error(f"Failed to save file: {e}")
         return False
+    
+    # Same sample already cloned in this session - don't upload it again
+    existing_voice_id = st.session_state.clone_cache.get(sample_hash)
+    if existing_voice_id:
+        os.remove(file_path)
+        st.info(f"This sample was already cloned. Voice ID: `{existing_voice_id}`")
+        return False
+    
+    st.success(f"✓ Saved: {filename}")
 
     # Create cloned voice
-    voice_name = voice_name.strip() or f"cloned_{uuid.uuid4().hex[:6]}"
+    voice_name = voice_name.strip() or f"cloned_{secrets.token_hex(3)}"
     
     with st.spinner("Creating cloned voice..."):
         try:
@@ -472,8 +680,9 @@ def handle_voice_cloning(uploaded_file, voice_name: str):
             if new_voice_id and new_voice_id != "Failed to create voice":
                 # Save to database
                 if save_user_voice(user_id, new_voice_id, voice_name):
+                    st.session_state.clone_cache[sample_hash] = new_voice_id
                     st.success(f"🎉 Voice created! ID: `{new_voice_id}`")
-                    fetch_voices()  # Refresh voice list
+                    invalidate_voices()  # Voice list is refetched on the rerun
                     return True
                 else:
                     # If DB save fails, delete from ElevenLabs
@@ -490,108 +699,181 @@ def handle_voice_cloning(uploaded_file, voice_name: str):
 # AUDIO GENERATION
 # ============================================================================
 
+def _segment_invalid(seg: Dict) -> bool:
+    """A segment needs non-blank text and a voice"""
+    text = seg.get("text")
+    # Empty text short-circuits before strip() allocates
+    return not text or not text.strip() or not seg.get("voice_id")
+
 def validate_segments() -> List[int]:
     """Validate segments and return indices of invalid ones"""
-    invalid = []
-    for i, seg in enumerate(st.session_state.segments):
-        if not seg.get("text", "").strip() or not seg.get("voice_id"):
-            invalid.append(i + 1)
-    return invalid
-
-def check_generation_limit(user_id: str, num_segments: int) -> bool:
-    """Check if user has remaining generations"""
+    return [i + 1 for i, seg in enumerate(st.session_state.segments) if _segment_invalid(seg)]
+
+def check_generation_limit(user_id: str, num_needed: int) -> bool:
+    """Check if user has generations left for num_needed new syntheses (from session usage, no round-trip once cached)"""
+    # Admins have unlimited; fully cached scripts cost nothing
+    if is_admin(user_id) or num_needed == 0:
+        return True
+    
     _, max_generations = get_user_limits(user_id)
-    current_count = get_user_generation_count(user_id)
+    current_count = _get_usage(user_id)["gens"]
     remaining = max_generations - current_count
     
-    # Admins have unlimited
-    if is_admin(user_id):
-        return True
-    
     if remaining <= 0:
         st.error(f"❌ You've reached your limit of {max_generations} generations.")
         return False
     
-    if num_segments > remaining:
-        st.error(f"❌ You have {remaining} generation(s) remaining, but trying to generate {num_segments} segment(s).")
+    if num_needed > remaining:
+        st.error(f"❌ You have {remaining} generation(s) remaining, but this script needs {num_needed} new segment(s).")
         return False
     
     return True
 
-def generate_single_segment(segment: Dict, output_dir: str, user_id: str, voice_name: str) -> Optional[str]:
-    """Generate audio for a single segment and save to database"""
-    try:
-        # Generate audio
-        output_path = ElevenLabsManager.convert_and_save_text_to_speech(
-            text=segment["text"],
-            voice_id=segment["voice_id"],
-            out_dir=output_dir
-        )
-        
-        if output_path and os.path.exists(output_path):
-            # Save generation record to database
-            save_tts_generation(user_id, segment["text"], segment["voice_id"], voice_name)
-            return output_path
-        return None
-    except Exception as e:
-        raise e
+def _user_tts_cache_dir(user_id: str) -> pathlib.Path:
+    """Per-user TTS cache: a cache hit is only free if this user already paid for it,
+    so other users' generations can't bypass the limit"""
+    cache_dir = TTS_CACHE_DIR / user_id
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    return cache_dir
 
 def generate_all_segments() -> tuple[List[str], List[str]]:
     """Generate audio for all segments. Returns (successful_paths, errors)"""
     user_id = st.session_state.user.get("id")
     
-    # Check generation limit
-    if not check_generation_limit(user_id, len(st.session_state.segments)):
+    segments = st.session_state.segments
+    
+    cache_dir = _user_tts_cache_dir(user_id)
+    
+    # Check generation limit - only audio that actually has to be synthesized counts
+    if not check_generation_limit(user_id, count_uncached(segments, cache_dir)):
         return [], ["Generation limit exceeded"]
     
-    generated = []
-    errors = []
+    generated, errors, synthesized = generate_segments_parallel(
+        segments, str(OUTPUTS_DIR), cache_dir, max_workers=MAX_TTS_WORKERS
+    )
     
-    for i, segment in enumerate(st.session_state.segments):
-        try:
-            # Get voice name for this segment
-            voice_name = segment.get("voice_label", "Unknown")
-            
-            output_path = generate_single_segment(segment, str(OUTPUTS_DIR), user_id, voice_name)
-            if output_path:
-                generated.append(output_path)
-            else:
-                errors.append(f"Segment {i+1}: Generation failed")
-        except Exception as e:
-            errors.append(f"Segment {i+1}: {str(e)}")
+    # Only audio that was actually synthesized gets a generation record
+    rows = [
+        build_tts_generation(user_id, seg["text"], seg["voice_id"], seg.get("voice_label", "Unknown"))
+        for seg in synthesized
+    ]
+    
+    # Save all generation records in one round-trip, and count them locally
+    # even if the insert fails so the session limit still holds
+    save_tts_generations(rows)
+    _bump_usage("gens", len(rows))
     
     return generated, errors
 
+def _silence_path() -> str:
+    """Return path to a 300ms silent MP3 matching the TTS output format, creating it once"""
+    path = TTS_CACHE_DIR / "silence_300ms.mp3"
+    if not path.exists():
+        tmp_path = TTS_CACHE_DIR / f"silence_{secrets.token_hex(16)}.mp3"
+        subprocess.run(
+            [FFMPEG_PATH, "-y", "-f", "lavfi", "-i", "anullsrc=r=44100:cl=mono",
+             "-t", "0.3", "-b:a", "128k", str(tmp_path)],
+            check=True, capture_output=True
+        )
+        os.replace(tmp_path, path)
+    return str(path)
+
+def _merge_with_ffmpeg(file_paths: List[str], output_path: str):
+    """Concatenate MP3s with ffmpeg's concat demuxer (stream copy, no re-encode)"""
+    silence = _silence_path()
+    entries = []
+    for i, path in enumerate(file_paths):
+        if i:
+            entries.append(silence)  # 300ms gap
+        entries.append(path)
+    
+    list_path = TTS_CACHE_DIR / f"concat_{secrets.token_hex(16)}.txt"
+    try:
+        with open(list_path, "w") as f:
+            for entry in entries:
+                escaped = os.path.abspath(entry).replace("'", "'\\''")
+                f.write(f"file '{escaped}'\n")
+        subprocess.run(
+            [FFMPEG_PATH, "-y", "-f", "concat", "-safe", "0", "-i", str(list_path),
+             "-c", "copy", output_path],
+            check=True, capture_output=True
+        )
+    finally:
+        list_path.unlink(missing_ok=True)
+
+def _merge_with_pydub(file_paths: List[str], output_path: str):
+    """Decode, concatenate and re-encode MP3s with pydub"""
+    from pydub import AudioSegment
+    
+    # Each decode shells out to ffmpeg, so run them concurrently (order kept by map)
+    with ThreadPoolExecutor(max_workers=min(len(file_paths), os.cpu_count() or 1)) as executor:
+        decoded = list(executor.map(lambda path: AudioSegment.from_file(path, format="mp3"), file_paths))
+    
+    # Repeated += copies the whole running buffer each time; bring every part to
+    # the first part's format and join the raw samples in a single pass instead
+    first = decoded[0]
+    
+    # One 300ms gap, built once in the target format and reused between all parts
+    silence = (
+        AudioSegment.silent(duration=300, frame_rate=first.frame_rate)
+        .set_sample_width(first.sample_width)
+        .set_channels(first.channels)
+        .raw_data
+    )
+    
+    chunks = []
+    for i, audio in enumerate(decoded):
+        if i:
+            chunks.append(silence)
+        chunks.append(
+            audio.set_frame_rate(first.frame_rate).set_channels(first.channels).set_sample_width(first.sample_width).raw_data
+        )
+    # join() sizes the output once and copies each part exactly once. Overlaying onto a
+    # pre-sized silent track would copy the full track per overlay, so it is not used.
+    combined = AudioSegment(
+        data=b"".join(chunks),
+        sample_width=first.sample_width,
+        frame_rate=first.frame_rate,
+        channels=first.channels
+    )
+    
+    combined.export(output_path, format="mp3")
+
 def merge_audio_files(file_paths: List[str]) -> str:
     """Merge multiple audio files into one. Returns merged file path."""
-    if not PYDUB_AVAILABLE:
-        raise RuntimeError("pydub not available for merging")
-    
-    combined = None
-    for path in file_paths:
-        audio = AudioSegment.from_file(path, format="mp3")
-        if combined is None:
-            combined = audio
-        else:
-            combined += AudioSegment.silent(duration=300)  # 300ms gap
-            combined += audio
+    if not FFMPEG_PATH and not PYDUB_AVAILABLE:
+        raise RuntimeError("ffmpeg or pydub required for merging")
     
-    output_filename = f"merged_{uuid.uuid4().hex}.mp3"
+    output_filename = f"merged_{secrets.token_hex(16)}.mp3"
     output_path = str(OUTPUTS_DIR / output_filename)
-    combined.export(output_path, format="mp3")
     
+    if FFMPEG_PATH:
+        try:
+            _merge_with_ffmpeg(file_paths, output_path)
+            return output_path
+        except (subprocess.CalledProcessError, OSError):
+            # Stream copy fails on mismatched inputs - re-encode with pydub instead
+            if not PYDUB_AVAILABLE:
+                raise
+    
+    _merge_with_pydub(file_paths, output_path)
     return output_path
 
-def create_zip_archive(file_paths: List[str]) -> str:
-    """Create ZIP archive of audio files. Returns ZIP file path."""
-    zip_filename = f"segments_{uuid.uuid4().hex}.zip"
-    zip_path = str(OUTPUTS_DIR / zip_filename)
-    
-    with zipfile.ZipFile(zip_path, "w") as z:
-        for file_path in file_paths:
-            z.write(file_path, arcname=os.path.basename(file_path))
-    
-    return zip_path
+@st.cache_data(show_spinner=False, max_entries=8)
+def _build_zip_archive(file_stats: tuple[tuple[str, float], ...]) -> bytes:
+    """Build ZIP bytes for (path, mtime) pairs; mtime is part of the cache key only"""
+    buf = io.BytesIO()
+    # MP3s are already compressed, so store them as-is
+    with zipfile.ZipFile(buf, "w", compression=zipfile.ZIP_STORED, allowZip64=True) as z:
+        for file_path, _ in file_stats:
+            with open(file_path, "rb") as src, z.open(os.path.basename(file_path), "w", force_zip64=True) as dst:
+                shutil.copyfileobj(src, dst, length=COPY_CHUNK_SIZE)
+    return buf.getvalue()
+
+def create_zip_archive(file_paths: List[str]) -> bytes:
+    """Create ZIP archive of audio files in memory. Returns ZIP bytes."""
+    file_stats = tuple((file_path, os.path.getmtime(file_path)) for file_path in file_paths)
+    return _build_zip_archive(file_stats)
 
 # ============================================================================
 # UI COMPONENTS - NAVIGATION
@@ -633,19 +915,21 @@ def render_usage_info():
         # Get user limits
         max_voices, max_generations = get_user_limits(user_id)
         
+        usage = _get_usage(user_id)
+        
         # Voice usage
-        voice_count = get_user_voice_count(user_id)
+        voice_count = usage["voices"]
         voice_remaining = max_voices - voice_count
         
         # Generation usage
-        gen_count = get_user_generation_count(user_id)
+        gen_count = usage["gens"]
         gen_remaining = max_generations - gen_count
         
         st.markdown("### 📊 Usage")
         
         # Voice quota
         st.markdown(f"**Voices:** {voice_count} / {max_voices}")
-        st.progress(min(voice_count / max_voices, 1.0))
+        st.progress(min(voice_count / max_voices, 1.0) if max_voices > 0 else 1.0)
         if voice_remaining > 0:
             st.caption(f"✓ {voice_remaining} voice slot(s) available")
         else:
@@ -655,7 +939,7 @@ def render_usage_info():
         
         # Generation quota
         st.markdown(f"**Generations:** {gen_count} / {max_generations}")
-        st.progress(min(gen_count / max_generations, 1.0))
+        st.progress(min(gen_count / max_generations, 1.0) if max_generations > 0 else 1.0)
         if gen_remaining > 0:
             st.caption(f"✓ {gen_remaining} generation(s) remaining")
         else:
@@ -685,6 +969,9 @@ def render_user_info():
             cache_key = f"is_admin_{user_id}"
             if cache_key in st.session_state:
                 del st.session_state[cache_key]
+            # Refetch usage counts and voice records on next render
+            st.session_state.usage = None
+            st.session_state.user_voices = None
             st.rerun()
         
         if st.button("🚪 Logout", use_container_width=True):
@@ -714,7 +1001,7 @@ def render_all_voices_tab():
     col1, col2 = st.columns([3, 1])
     with col2:
         if st.button("🔄 Refresh", use_container_width=True, key="refresh_all"):
-            fetch_voices()
+            invalidate_voices()
             st.rerun()
     
     st.divider()
@@ -754,22 +1041,23 @@ def render_my_voices_tab():
     col1, col2 = st.columns([3, 1])
     with col2:
         if st.button("🔄 Refresh", use_container_width=True, key="refresh_my"):
-            fetch_voices()
+            st.session_state.user_voices = None
+            invalidate_voices()
             st.rerun()
     
     st.divider()
     
     user_id = st.session_state.user.get("id")
-    user_voices_db = get_user_voices(user_id)
+    user_voices_db = _get_user_voices(user_id)
     
     if not user_voices_db:
         st.info("You haven't created any voices yet. Go to the Editor to clone a voice!")
         return
     
     # Get full voice details
-    all_voices = st.session_state.voices_cached
-    user_voice_ids = {v["voice_id"] for v in user_voices_db}
-    user_voices = [v for v in all_voices if v.get("voice_id") in user_voice_ids]
+    voices_by_id = st.session_state.voices_by_id
+    user_voice_ids = dict.fromkeys(v["voice_id"] for v in user_voices_db)
+    user_voices = [voices_by_id[vid] for vid in user_voice_ids if vid in voices_by_id]
     
     st.markdown(f"**You have {len(user_voices)} cloned voice(s)**")
     
@@ -792,7 +1080,6 @@ def render_my_voices_tab():
                         if delete_voice_from_elevenlabs(voice_id):
                             delete_user_voice(user_id, voice_id)
                             st.success(f"✓ Deleted {voice_name}")
-                            fetch_voices()
                             st.rerun()
 
 # ============================================================================
@@ -806,7 +1093,7 @@ def render_sidebar_editor():
         
         user_id = st.session_state.user.get("id")
         max_voices, _ = get_user_limits(user_id)
-        voice_count = get_user_voice_count(user_id)
+        voice_count = _get_usage(user_id)["voices"]
         
         # Show different message for admins
         if is_admin(user_id):
@@ -817,10 +1104,10 @@ def render_sidebar_editor():
         # Always show upload form
         st.caption("Upload ONE audio file (MP3/WAV)")
         
-        uploaded_files = st.file_uploader(
+        uploaded_file = st.file_uploader(
             "Audio file",
             type=["mp3", "wav"],
-            accept_multiple_files=True,
+            accept_multiple_files=False,
             key="voice_upload"
         )
         
@@ -832,12 +1119,10 @@ def render_sidebar_editor():
         if st.button("Create Cloned Voice", use_container_width=True, disabled=button_disabled):
             if not voice_name or not voice_name.strip():
                 st.error("Please enter a voice name")
-            elif not uploaded_files:
+            elif uploaded_file is None:
                 st.error("Please upload an audio file")
-            elif len(uploaded_files) > 1:
-                st.error("❌ Only ONE file allowed")
             else:
-                if handle_voice_cloning(uploaded_files[0], voice_name):
+                if handle_voice_cloning(uploaded_file, voice_name):
                     st.rerun()
         
         st.divider()
@@ -855,8 +1140,9 @@ def render_sidebar_editor():
                 st.session_state.segments = [create_new_segment()]
                 st.rerun()
 
-def render_segment(segment: Dict, index: int):
-    """Render a single segment editor"""
+@st.fragment
+def render_segment(segment: Dict, index: int, labels: List[str], label_to_id: Dict[str, str]):
+    """Render a single segment editor (a fragment, so edits only rerun this segment)"""
     st.markdown(f"### Segment {index + 1}")
     
     col1, col2, col3 = st.columns([6, 2, 1])
@@ -871,16 +1157,9 @@ def render_segment(segment: Dict, index: int):
         )
     
     with col2:
-        voice_options = get_voice_options()
-        
-        if voice_options:
-            labels = [v[0] for v in voice_options]
-            
+        if labels:
             current_label = segment.get("voice_label", "Choose voice")
-            try:
-                selected_idx = labels.index(current_label) if current_label in labels else 0
-            except:
-                selected_idx = 0
+            selected_idx = labels.index(current_label) if current_label in label_to_id else 0
             
             choice = st.selectbox(
                 "Voice",
@@ -890,7 +1169,7 @@ def render_segment(segment: Dict, index: int):
             )
             
             segment["voice_label"] = choice
-            segment["voice_id"] = next((v[1] for v in voice_options if v[0] == choice), None)
+            segment["voice_id"] = label_to_id.get(choice)
             
             if segment.get("voice_id"):
                 st.caption(f"ID: {segment['voice_id'][:8]}...")
@@ -900,7 +1179,12 @@ def render_segment(segment: Dict, index: int):
     with col3:
         if st.button("✕", key=f"remove_{segment['id']}", use_container_width=True):
             st.session_state.segments.pop(index)
-            st.rerun()
+            # Segment list changed, so the whole page (not just this fragment) must rerun
+            st.rerun(scope="app")
+
+def _path_key(path: str) -> str:
+    """Short stable key derived from a file path, for widget keys and names"""
+    return hashlib.blake2b(path.encode(), digest_size=8).hexdigest()
 
 def render_generation_controls():
     """Render audio generation buttons"""
@@ -910,43 +1194,41 @@ def render_generation_controls():
     num_segments = len(st.session_state.segments)
     user_id = st.session_state.user.get("id")
     
-    # Check if admin - direct database query for reliability
-    supabase = get_supabase_client()
-    user_is_admin = False
-    
-    if supabase and user_id:
-        try:
-            response = supabase.table("user_roles").select("role").eq("user_id", user_id).execute()
-            if response.data and len(response.data) > 0:
-                user_is_admin = response.data[0].get("role") == ADMIN_ROLE
-        except:
-            pass
+    # Admin status is cached per session; "Refresh Status" clears it
+    user_is_admin = is_admin(user_id)
     
     # Show appropriate message based on role
     if user_is_admin:
         st.success("👑 Admin: Unlimited generations available")
         gen_remaining = 999999
+        num_needed = 0
     else:
         _, max_generations = get_user_limits(user_id)
-        gen_remaining = max_generations - get_user_generation_count(user_id)
+        gen_remaining = max(0, max_generations - _get_usage(user_id)["gens"])
+        # Only new (voice, text) pairs are charged; repeats and audio this user
+        # already generated are served from the cache for free
+        num_needed = count_uncached(st.session_state.segments, _user_tts_cache_dir(user_id))
         
-        if gen_remaining <= 0:
+        if gen_remaining <= 0 and num_needed > 0:
             st.error(f"❌ You've used all {max_generations} generations.")
             return
         
-        st.info(f"💡 You have {gen_remaining} generation(s) remaining. Each segment counts as one generation.")
+        st.info(
+            f"💡 You have {gen_remaining} generation(s) remaining; this script needs {num_needed}. "
+            "Each new text/voice combination counts as one generation - repeated or previously generated segments are free."
+        )
     
     col1, col2, col3 = st.columns(3)
     
     # Button 1: Generate individual segments
     with col1:
-        btn1_disabled = False if user_is_admin else (num_segments < 1 or num_segments > gen_remaining)
+        btn1_disabled = False if user_is_admin else (num_segments < 1 or num_needed > gen_remaining)
         if st.button("🎬 Generate Segments", use_container_width=True, disabled=btn1_disabled):
             invalid = validate_segments()
             if invalid:
                 st.error(f"Invalid segments: {invalid}")
             else:
-                with st.spinner("Generating..."):
+                with st.spinner(f"Generating {num_segments} segment(s) in parallel..."):
                     generated, errors = generate_all_segments()
                     st.session_state.last_generated_files = generated
                     
@@ -957,13 +1239,13 @@ def render_generation_controls():
     
     # Button 2: Generate and merge
     with col2:
-        btn2_disabled = False if user_is_admin else (num_segments < 2 or num_segments > gen_remaining)
+        btn2_disabled = False if user_is_admin else (num_segments < 2 or num_needed > gen_remaining)
         if st.button("🔗 Generate & Merge", use_container_width=True, disabled=btn2_disabled):
             invalid = validate_segments()
             if invalid:
                 st.error(f"Invalid segments: {invalid}")
             else:
-                with st.spinner("Generating and merging..."):
+                with st.spinner(f"Generating {num_segments} segment(s) in parallel and merging..."):
                     generated, errors = generate_all_segments()
                     st.session_state.last_generated_files = generated
                     
@@ -975,35 +1257,38 @@ def render_generation_controls():
                     else:
                         merged_successfully = False
                         
-                        if PYDUB_AVAILABLE:
+                        if FFMPEG_PATH or PYDUB_AVAILABLE:
                             try:
                                 merged_path = merge_audio_files(generated)
                                 st.success(f"✓ Merged: {os.path.basename(merged_path)}")
                                 
                                 st.audio(merged_path, format="audio/mp3")
-                                with open(merged_path, "rb") as f:
-                                    st.download_button(
-                                        "⬇️ Download Merged MP3",
-                                        data=f.read(),
-                                        file_name=os.path.basename(merged_path),
-                                        mime="audio/mpeg"
-                                    )
+                                # download_button needs the whole file; read_bytes() sizes the buffer from fstat
+                                st.download_button(
+                                    "⬇️ Download Merged MP3",
+                                    data=pathlib.Path(merged_path).read_bytes(),
+                                    file_name=os.path.basename(merged_path),
+                                    mime="audio/mpeg",
+                                    key=f"download_{_path_key(merged_path)}"
+                                )
                                 merged_successfully = True
                             except Exception as e:
                                 st.warning(f"Merge failed: {e}. Creating ZIP instead...")
                         
                         if not merged_successfully:
                             try:
-                                zip_path = create_zip_archive(generated)
-                                st.success(f"✓ Created ZIP: {os.path.basename(zip_path)}")
+                                zip_data = create_zip_archive(generated)
+                                zip_key = _path_key("\0".join(generated))
+                                zip_filename = f"segments_{zip_key}.zip"
+                                st.success(f"✓ Created ZIP: {zip_filename}")
                                 
-                                with open(zip_path, "rb") as f:
-                                    st.download_button(
-                                        "⬇️ Download ZIP",
-                                        data=f.read(),
-                                        file_name=os.path.basename(zip_path),
-                                        mime="application/zip"
-                                    )
+                                st.download_button(
+                                    "⬇️ Download ZIP",
+                                    data=zip_data,
+                                    file_name=zip_filename,
+                                    mime="application/zip",
+                                    key=f"download_{zip_key}"
+                                )
                             except Exception as e:
                                 st.error(f"Failed to create ZIP: {e}")
     
@@ -1030,8 +1315,15 @@ def render_editor_page():
     st.markdown("## 📝 Script Segments")
     st.caption("Each segment = text + voice")
     
+    # Resolve voice labels once for all segments
+    voice_options = get_voice_options()
+    labels = [label for label, _ in voice_options]
+    label_to_id = {}
+    for label, voice_id in voice_options:
+        label_to_id.setdefault(label, voice_id)  # first match wins on duplicate names
+    
     for idx, segment in enumerate(st.session_state.segments):
-        render_segment(segment, idx)
+        render_segment(segment, idx, labels, label_to_id)
     
     # Generation controls
     render_generation_controls()
@@ -1048,9 +1340,8 @@ def main():
     # Check authentication
     check_authentication()
     
-    # Fetch voices if not cached
-    if not st.session_state.voices_cached:
-        fetch_voices()
+    # Fetch voices and usage if not cached
+    load_session_data(st.session_state.user.get("id"))
     
     # Navigation
     render_navigation()
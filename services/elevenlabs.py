@@ -1,96 +1,504 @@
 import os
+import asyncio
+import base64
+import json
+import itertools
+import mmap
+import pathlib
+import secrets
+import threading
+import weakref
+from concurrent.futures import Future, ThreadPoolExecutor
 from core.config import settings
 from core.logger import logger
 
-from io import BytesIO
-import uuid
+from functools import lru_cache
+from typing import AsyncIterator, Iterator, List, Optional
 
-from elevenlabs import ElevenLabs, VoiceSettings
+import httpx
+from websockets.asyncio.client import connect as ws_connect
+from elevenlabs import AsyncElevenLabs, ElevenLabs, VoiceSettings
 from elevenlabs.play import play
 
+# Output formats: the high-bitrate default for saved files, and a ~4x smaller one
+# for low-latency playback
+DEFAULT_OUTPUT_FORMAT = "mp3_44100_128"
+LOW_LATENCY_OUTPUT_FORMAT = "mp3_22050_32"
+
+# SDK chunks are often <1 KB; they are merged into at least this much per write
+MIN_CHUNK_SIZE = 1 << 16  # 64 KiB
+
+# Max TTS requests in flight against the account's concurrency cap, shared by the
+# request pool and streaming saves (convert_and_save_text_to_speech)
+TTS_POOL_CONCURRENCY = 4
+_request_slots = threading.BoundedSemaphore(TTS_POOL_CONCURRENCY)
+
+# WebSocket TTS: one socket per (voice, model, format) carries many requests, each
+# in its own context. The server drops idle sockets after this many seconds (API max).
+WS_URL = "wss://api.elevenlabs.io/v1/text-to-speech/{voice_id}/multi-stream-input"
+WS_INACTIVITY_TIMEOUT = 180
+
+# Output file names: pid + per-process counter keep them unique, the short random
+# suffix guards against pid reuse across restarts
+_file_counter = itertools.count()
+
+
+def _output_file_path(out_dir: str, output_format: str) -> str:
+    return f"{out_dir}/{os.getpid()}-{next(_file_counter)}-{secrets.token_hex(4)}.{output_format.split('_')[0]}"
+
+
+# Merge small stream chunks into >= min_size blocks
+def _coalesce(chunks: Iterator[bytes], min_size: int = MIN_CHUNK_SIZE) -> Iterator[bytes]:
+    buf = bytearray()
+    for chunk in chunks:
+        buf.extend(chunk)
+        if len(buf) >= min_size:
+            yield bytes(buf)
+            buf.clear()
+    if buf:
+        yield bytes(buf)
+
+
+# Keep-alive connection pool shared by all calls, so requests reuse the TLS connection
+_http_client = httpx.Client(
+    transport=httpx.HTTPTransport(retries=1),
+    timeout=httpx.Timeout(30.0, connect=5.0),
+    limits=httpx.Limits(max_keepalive_connections=32, max_connections=64),
+)
+
+
+# REQUEST POOL
+# A background event loop owns one AsyncElevenLabs client and a queue of pending
+# requests; a fixed number of workers drain it, so bursts from many threads share
+# the same connections. Workers also take a _request_slots slot per request, so
+# pool and streaming-save traffic together stay within TTS_POOL_CONCURRENCY.
+class _TTSPool:
+    def __init__(self, max_concurrent: int):
+        self._max_concurrent = max_concurrent
+        self._loop = None
+        self._queue = None
+        self._client = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_started(self):
+        with self._start_lock:
+            if self._loop is not None:
+                return
+            loop = asyncio.new_event_loop()
+            ready = threading.Event()
+
+            def run():
+                asyncio.set_event_loop(loop)
+                self._queue = asyncio.Queue()
+                self._client = AsyncElevenLabs(
+                    api_key=settings.ELEVENLABS_API_KEY,
+                    httpx_client=httpx.AsyncClient(
+                        timeout=httpx.Timeout(30.0, connect=5.0),
+                        limits=httpx.Limits(max_keepalive_connections=32, max_connections=64),
+                    ),
+                )
+                for _ in range(self._max_concurrent):
+                    loop.create_task(self._worker())
+                ready.set()
+                loop.run_forever()
+
+            threading.Thread(target=run, name="tts-pool", daemon=True).start()
+            ready.wait()
+            self._loop = loop
+
+    async def _worker(self):
+        while True:
+            request, future = await self._queue.get()
+            try:
+                if future.set_running_or_notify_cancel():
+                    # Wait for a slot off the loop so other workers keep running
+                    await asyncio.to_thread(_request_slots.acquire)
+                    try:
+                        future.set_result(await self._synthesize(**request))
+                    except Exception as e:
+                        future.set_exception(e)
+                    finally:
+                        _request_slots.release()
+            finally:
+                self._queue.task_done()
+
+    async def _synthesize(self, text: str, voice_id: str, model_id: str, output_format: str, voice_settings: VoiceSettings) -> bytearray:
+        buf = bytearray()
+        async for chunk in self._client.text_to_speech.stream(
+            text=text,
+            voice_id=voice_id,
+            model_id=model_id,
+            output_format=output_format,
+            voice_settings=voice_settings,
+        ):
+            if chunk:
+                buf.extend(chunk)
+        # Handed over as-is; callers get views, so there's no final copy
+        return buf
+
+    # Thread-safe; block on .result() or wrap with asyncio.wrap_future
+    def submit(self, text: str, voice_id: str, model_id: str, output_format: str, voice_settings: VoiceSettings) -> Future:
+        self._ensure_started()
+        future = Future()
+        request = {"text": text, "voice_id": voice_id, "model_id": model_id, "output_format": output_format, "voice_settings": voice_settings}
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, (request, future))
+        return future
+
+
+# WEBSOCKET SESSION
+# Keeps one socket open and multiplexes requests over it by context id; a reader
+# task routes incoming audio to each request's queue. When the socket ends (server
+# close, aclose(), or asyncio.run cancelling leftover tasks at shutdown) the reader
+# closes it and calls on_close, so the owner can drop the session.
+class _WSSession:
+    def __init__(self, voice_id: str, model_id: str, output_format: str, on_close=None):
+        self._url = (
+            f"{WS_URL.format(voice_id=voice_id)}?model_id={model_id}"
+            f"&output_format={output_format}&inactivity_timeout={WS_INACTIVITY_TIMEOUT}"
+        )
+        self._ws = None
+        self._reader = None
+        self._queues = {}
+        self._connect_lock = asyncio.Lock()
+        self._on_close = on_close
+
+    async def _ensure_connected(self):
+        async with self._connect_lock:
+            if self._ws is not None:
+                return self._ws
+            self._ws = await ws_connect(self._url, additional_headers={"xi-api-key": settings.ELEVENLABS_API_KEY})
+            # Hold a reference so the reader task isn't garbage collected
+            self._reader = asyncio.create_task(self._read(self._ws))
+            logger.info("ElevenLabs WebSocket connected")
+            return self._ws
+
+    async def _read(self, ws):
+        error = ConnectionError("ElevenLabs WebSocket closed")
+        try:
+            async for message in ws:
+                data = json.loads(message)
+                queue = self._queues.get(data.get("contextId"))
+                if queue is None:
+                    continue
+                if data.get("audio"):
+                    queue.put_nowait(base64.b64decode(data["audio"]))
+                if data.get("isFinal"):
+                    queue.put_nowait(None)
+        except asyncio.CancelledError:
+            error = ConnectionError("ElevenLabs WebSocket session closed")
+            raise
+        except Exception as e:
+            logger.error(str(e))
+            error = e
+        finally:
+            try:
+                await ws.close()
+            except Exception as e:
+                logger.error(str(e))
+            if self._ws is ws:
+                self._ws = None
+                self._reader = None
+            # Unblock requests still waiting on this socket
+            for queue in self._queues.values():
+                queue.put_nowait(error)
+            if self._on_close is not None:
+                self._on_close(self)
+
+    async def aclose(self):
+        reader = self._reader
+        if reader is not None:
+            # The reader closes the socket on its way out
+            reader.cancel()
+            await asyncio.gather(reader, return_exceptions=True)
+        elif self._ws is not None:
+            await self._ws.close()
+            self._ws = None
+
+    async def stream(self, text: str, voice_settings: dict) -> AsyncIterator[bytes]:
+        ws = await self._ensure_connected()
+        context_id = secrets.token_hex(8)
+        queue = asyncio.Queue()
+        self._queues[context_id] = queue
+        try:
+            await ws.send(json.dumps({
+                "text": " ",
+                "context_id": context_id,
+                "voice_settings": voice_settings,
+            }))
+            await ws.send(json.dumps({"text": text if text.endswith(" ") else f"{text} ", "context_id": context_id, "flush": True}))
+            await ws.send(json.dumps({"context_id": context_id, "close_context": True}))
+
+            while True:
+                item = await queue.get()
+                if item is None:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            self._queues.pop(context_id, None)
+
 
 class ElevenLabsManager:
-    client = ElevenLabs(api_key=settings.ELEVENLABS_API_KEY)
+    client = ElevenLabs(api_key=settings.ELEVENLABS_API_KEY, httpx_client=_http_client)
+    _pool = _TTSPool(max_concurrent=TTS_POOL_CONCURRENCY)
+    # Built once and shared; pass voice_settings to override per call
+    _DEFAULT_VOICE_SETTINGS = VoiceSettings(
+        stability=0.0,
+        similarity_boost=1.0,
+        style=0.0,
+        use_speaker_boost=True,
+        speed=1.0,
+    )
+    # event loop -> {(voice_id, model_id, output_format): _WSSession}; sessions evict
+    # themselves when their socket closes, and a finished loop drops its entry
+    _ws_sessions = weakref.WeakKeyDictionary()
 
-    # SIMPLE TTS
+    # PREWARM - open a pooled connection ahead of the first real request
     @classmethod
-    def convert_text_to_speech(cls, text: str, voice_id: str = "ZF6FPAbjXT4488VcRRnw"):
+    def prewarm(cls):
+        try:
+            cls.client.voices.get_all()
+            logger.info("ElevenLabs connection pool warmed")
+        except Exception as e:
+            logger.error(str(e))
+
+    # STREAMING TTS - yields MP3 chunks as they are generated
+    # (pass model_id="eleven_flash_v2_5" / "eleven_turbo_v2_5" for lowest latency)
+    @classmethod
+    def stream_text_to_speech(
+        cls,
+        text: str,
+        voice_id: str = "ZF6FPAbjXT4488VcRRnw",
+        model_id: Optional[str] = None,
+        optimize_streaming_latency: int = 3,
+        output_format: str = DEFAULT_OUTPUT_FORMAT,
+        low_latency: bool = False,
+        voice_settings: Optional[VoiceSettings] = None,
+    ) -> Iterator[bytes]:
+        if low_latency:
+            output_format = LOW_LATENCY_OUTPUT_FORMAT
+            optimize_streaming_latency = 3
+        logger.info(f"Streaming text to speech for text: {text}")
+        return cls.client.text_to_speech.stream(
+            text=text,
+            voice_id=voice_id,
+            model_id=model_id or settings.ELEVENLABS_MODEL,
+            output_format=output_format,
+            optimize_streaming_latency=optimize_streaming_latency,
+            voice_settings=voice_settings or cls._DEFAULT_VOICE_SETTINGS,
+        )
+
+    # CACHED SYNTHESIS - repeat (text, voice, model) requests are served from memory.
+    # Raises on failure so errors are never cached. Only default voice settings are
+    # cached; VoiceSettings isn't hashable, so overrides go straight to the pool.
+    # The cached buffer is mutable: only hand out read-only views of it.
+    @classmethod
+    @lru_cache(maxsize=32)
+    def _synthesize(cls, text: str, voice_id: str, model_id: str, output_format: str) -> bytearray:
+        return cls._pool.submit(text, voice_id, model_id, output_format, cls._DEFAULT_VOICE_SETTINGS).result()
+
+    # SIMPLE TTS - returns a read-only view over the audio (zero-copy); call
+    # bytes() on it only where an immutable object is required
+    @classmethod
+    def convert_text_to_speech(
+        cls,
+        text: str,
+        voice_id: str = "ZF6FPAbjXT4488VcRRnw",
+        model_id: Optional[str] = None,
+        output_format: str = DEFAULT_OUTPUT_FORMAT,
+        low_latency: bool = False,
+        voice_settings: Optional[VoiceSettings] = None,
+    ) -> memoryview:
+        if low_latency:
+            output_format = LOW_LATENCY_OUTPUT_FORMAT
         try:
             logger.info(f"Converting text to speech for text: {text}")
-            audio = cls.client.text_to_speech.convert(
-                text=text,
-                voice_id=voice_id,
-                model_id=settings.ELEVENLABS_MODEL,
-                output_format="mp3_44100_128",
-                voice_settings=VoiceSettings(
-                    stability=0.0,
-                    similarity_boost=1.0,
-                    style=0.0,
-                    use_speaker_boost=True,
-                    speed=1.0,
-                )
-            )
-            
-            logger.info(f"Playing audio.")
+            model_id = model_id or settings.ELEVENLABS_MODEL
+            if voice_settings is not None:
+                audio = cls._pool.submit(text, voice_id, model_id, output_format, voice_settings).result()
+            else:
+                audio = cls._synthesize(text, voice_id, model_id, output_format)
+            return memoryview(audio).toreadonly()
         except Exception as e:
             logger.error(str(e))
+            return memoryview(b"")
+
+    # BATCH TTS - results in input order; failed texts come back empty.
+    # In-flight API calls are still capped at TTS_POOL_CONCURRENCY.
+    @classmethod
+    def convert_many(
+        cls,
+        texts: List[str],
+        voice_id: str = "ZF6FPAbjXT4488VcRRnw",
+        model_id: Optional[str] = None,
+        output_format: str = DEFAULT_OUTPUT_FORMAT,
+        max_workers: int = 8,
+    ) -> List[memoryview]:
+        if not texts:
+            return []
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(texts))) as executor:
+            return list(executor.map(
+                lambda text: cls.convert_text_to_speech(text=text, voice_id=voice_id, model_id=model_id, output_format=output_format),
+                texts,
+            ))
+
+    # PCM TTS - raw int16 samples at sample_rate, ready for local playback or mixing.
+    # Skips MP3 encode/decode entirely. The array is a read-only view over the
+    # (cached) response, not a copy; None if synthesis failed. numpy/sounddevice are
+    # optional (not in requirements.txt; the web app doesn't use these helpers) and
+    # imported on use, so a missing one raises ImportError here.
+    @classmethod
+    def convert_text_to_pcm(
+        cls,
+        text: str,
+        voice_id: str = "ZF6FPAbjXT4488VcRRnw",
+        sample_rate: int = 16000,
+        model_id: Optional[str] = None,
+    ):
+        import numpy as np
+
+        audio = cls.convert_text_to_speech(text=text, voice_id=voice_id, model_id=model_id, output_format=f"pcm_{sample_rate}")
+        if not audio:
+            return None
+        return np.frombuffer(audio, dtype=np.int16)
+
+    # PLAYBACK - PCM goes straight to the sound card; MP3 is decoded by ffplay
+    @classmethod
+    def play_audio(cls, audio, output_format: str = DEFAULT_OUTPUT_FORMAT):
+        # Missing dependencies should fail loudly, not play nothing
+        if output_format.startswith("pcm_"):
+            import numpy as np
+            import sounddevice as sd
 
         try:
-            # 
-            audio_bytes = b"".join(chunk for chunk in audio if chunk)
-            return audio_bytes
+            if output_format.startswith("pcm_"):
+                samples = audio if isinstance(audio, np.ndarray) else np.frombuffer(audio, dtype=np.int16)
+                sd.play(samples, int(output_format.split("_")[1]))
+                sd.wait()
+            else:
+                # elevenlabs.play wants bytes; copy only at this boundary
+                play(bytes(audio))
         except Exception as e:
             logger.error(str(e))
-            print("Failed to play audio. Ensure ffmpeg/ffplay is installed on your system.")
 
-    # SAVE IN DIR
+    # Write a whole chunk to fd, resuming after short writes
+    @staticmethod
+    def _write_all(fd: int, chunk: bytes):
+        view = memoryview(chunk)
+        while view:
+            try:
+                written = os.write(fd, view)
+            except InterruptedError:
+                continue
+            view = view[written:]
+
+    # SAVE IN DIR - chunks go to disk as they arrive, so memory stays O(chunk)
     @classmethod
-    def convert_and_save_text_to_speech(cls, text: str, out_dir:str, voice_id: str = "ZF6FPAbjXT4488VcRRnw") -> str:
+    def convert_and_save_text_to_speech(cls, text: str, out_dir:str, voice_id: str = "ZF6FPAbjXT4488VcRRnw", output_format: str = DEFAULT_OUTPUT_FORMAT, voice_settings: Optional[VoiceSettings] = None) -> str:
+        logger.info(f"Converting text to speech for text: {text}")
+        file_path = _output_file_path(out_dir, output_format)
+
         try:
-            logger.info(f"Converting text to speech for text: {text}")
-            audio = cls.client.text_to_speech.convert(
-                text=text,
-                voice_id=voice_id,
-                model_id=settings.ELEVENLABS_MODEL,
-                output_format="mp3_44100_128",
-                voice_settings=VoiceSettings(
-                    stability=0.0,
-                    similarity_boost=1.0,
-                    style=0.0,
-                    use_speaker_boost=True,
-                    speed=1.0,
-                )
-            )
+            # The stream is lazy, so hold a request slot until it's fully consumed
+            with _request_slots:
+                # No latency optimizations: saved files keep full text normalization
+                audio = cls.stream_text_to_speech(text=text, voice_id=voice_id, optimize_streaming_latency=0, output_format=output_format, voice_settings=voice_settings)
+
+                fd = os.open(file_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+                try:
+                    if hasattr(os, "posix_fadvise"):
+                        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+                    for chunk in _coalesce(audio):
+                        cls._write_all(fd, chunk)
+                finally:
+                    os.close(fd)
+            logger.info(f"File saved at {file_path}")
+
+            return file_path
 
         except Exception as e:
             logger.error(str(e))
+            # Don't leave a truncated file behind
+            try:
+                os.remove(file_path)
+            except OSError:
+                pass
+            return "Failed to save file"
 
+    # ASYNC TTS - await many of these with asyncio.gather to synthesize concurrently
+    # (runs on the request pool, so it works from any event loop)
+    @classmethod
+    async def aconvert_text_to_speech(cls, text: str, voice_id: str = "ZF6FPAbjXT4488VcRRnw", model_id: Optional[str] = None, output_format: str = DEFAULT_OUTPUT_FORMAT, voice_settings: Optional[VoiceSettings] = None) -> bytearray:
         try:
-            logger.info("Creating file name")
-            # os.makedirs("outputs/ivc", exist_ok=True)
-            file_path = f"{out_dir}/{uuid.uuid4()}.mp3"
-            
-            with open(file_path, "wb") as f:
-                for chunk in audio:
-                    if chunk:
-                        f.write(chunk)
+            logger.info(f"Converting text to speech (async) for text: {text}")
+            future = cls._pool.submit(text, voice_id, model_id or settings.ELEVENLABS_MODEL, output_format, voice_settings or cls._DEFAULT_VOICE_SETTINGS)
+            # Not cached, so the caller can own the buffer outright
+            return await asyncio.wrap_future(future)
+        except Exception as e:
+            logger.error(str(e))
+            return bytearray()
+
+    # ASYNC SAVE IN DIR
+    @classmethod
+    async def aconvert_and_save_text_to_speech(cls, text: str, out_dir: str, voice_id: str = "ZF6FPAbjXT4488VcRRnw", output_format: str = DEFAULT_OUTPUT_FORMAT, voice_settings: Optional[VoiceSettings] = None) -> str:
+        audio = await cls.aconvert_text_to_speech(text=text, voice_id=voice_id, output_format=output_format, voice_settings=voice_settings)
+        if not audio:
+            return "Failed to save file"
+
+        try:
+            file_path = _output_file_path(out_dir, output_format)
+            # Write in a worker thread so the event loop keeps serving other requests
+            await asyncio.to_thread(pathlib.Path(file_path).write_bytes, audio)
             logger.info(f"File saved at {file_path}")
-            
             return file_path
-        
         except Exception as e:
             logger.error(str(e))
             return "Failed to save file"
 
+    # WEBSOCKET TTS - for many short requests in one session; reuses an open socket
+    # instead of paying connection setup per request. Yields MP3 chunks.
+    @classmethod
+    async def stream_ws(cls, text: str, voice_id: str = "ZF6FPAbjXT4488VcRRnw", model_id: Optional[str] = None, output_format: str = DEFAULT_OUTPUT_FORMAT, voice_settings: Optional[VoiceSettings] = None) -> AsyncIterator[bytes]:
+        model_id = model_id or settings.ELEVENLABS_MODEL
+        # Sockets are bound to the loop that opened them
+        sessions = cls._ws_sessions.setdefault(asyncio.get_running_loop(), {})
+        key = (voice_id, model_id, output_format)
+        session = sessions.get(key)
+        if session is None:
+            def evict(closed):
+                if sessions.get(key) is closed:
+                    del sessions[key]
+
+            session = sessions[key] = _WSSession(voice_id, model_id, output_format, on_close=evict)
+
+        logger.info(f"Streaming text to speech (websocket) for text: {text}")
+        settings_payload = (voice_settings or cls._DEFAULT_VOICE_SETTINGS).model_dump(exclude_none=True)
+        async for chunk in session.stream(text, settings_payload):
+            yield chunk
+
+    # Close this event loop's WebSocket sessions; call before the loop shuts down
+    # (asyncio.run also closes them when it cancels leftover tasks)
+    @classmethod
+    async def aclose_ws(cls):
+        sessions = cls._ws_sessions.pop(asyncio.get_running_loop(), {})
+        for session in list(sessions.values()):
+            await session.aclose()
+
     # CREATE IVC
     @classmethod
-    def create_instant_voice_clone(cls, input_voice_file_path: str, voice_name: str = str(uuid.uuid4())) -> str: 
+    def create_instant_voice_clone(cls, input_voice_file_path: str, voice_name: Optional[str] = None) -> str: 
+        # Computed per call; a default argument would be evaluated once at import
+        voice_name = voice_name or f"clone-{secrets.token_hex(4)}"
         try:
-            logger.info(f"Creating voice {voice_name}")
-            voice = cls.client.voices.ivc.create(
-                name=voice_name,
-                files=[BytesIO(open(input_voice_file_path, "rb").read())]
-            )
+            # Map the clip instead of reading it: the upload reads straight from
+            # the page cache without a Python-side copy
+            with open(input_voice_file_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                logger.info(f"Creating voice {voice_name}")
+                voice = cls.client.voices.ivc.create(
+                    name=voice_name,
+                    files=[mm]
+                )
             logger.info(f"Created voice {voice} with voice id {voice.voice_id}")
             
             return voice.voice_id
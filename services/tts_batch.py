@@ -0,0 +1,114 @@
+import os
+import hashlib
+import pathlib
+import secrets
+import shutil
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, Optional
+
+from core.config import settings
+from core.logger import logger
+from services.elevenlabs import ElevenLabsManager
+
+
+# CACHE PATH
+def tts_cache_path(cache_dir: pathlib.Path, text: str, voice_id: str) -> pathlib.Path:
+    """Content-addressed cache path for a synthesized (model, voice, text) triple"""
+    key = hashlib.sha256(f"{settings.ELEVENLABS_MODEL}|{voice_id}|{text}".encode()).hexdigest()
+    return cache_dir / f"{key}.mp3"
+
+
+# COUNT CACHE MISSES
+def count_uncached(segments: List[Dict], cache_dir: pathlib.Path) -> int:
+    """Count distinct (voice_id, text) pairs not already in the cache"""
+    pairs = {(seg.get("voice_id"), seg.get("text", "")) for seg in segments}
+    return sum(1 for voice_id, text in pairs if not tts_cache_path(cache_dir, text, voice_id).exists())
+
+
+# SINGLE SEGMENT
+def _generate_one(segment: Dict, out_dir: str, cache_dir: pathlib.Path) -> tuple[Optional[str], bool]:
+    """Returns (output_path, synthesized). Cache hits return the cached file with synthesized=False"""
+    cache_path = tts_cache_path(cache_dir, segment["text"], segment["voice_id"])
+    if cache_path.exists():
+        return str(cache_path), False
+
+    output_path = ElevenLabsManager.convert_and_save_text_to_speech(
+        text=segment["text"],
+        voice_id=segment["voice_id"],
+        out_dir=out_dir
+    )
+
+    # The manager returns a path on success, so no need to stat it
+    if output_path and output_path != "Failed to save file":
+        os.replace(output_path, cache_path)
+        return str(cache_path), True
+    return None, False
+
+
+# BATCH
+def generate_segments_parallel(segments: List[Dict], out_dir: str, cache_dir: pathlib.Path, max_workers: int = 8) -> tuple[List[str], List[str], List[Dict]]:
+    """Generate audio for all segments concurrently.
+
+    Each distinct (voice_id, text) pair is synthesized at most once and cached on disk;
+    duplicates get their own copy of the file.
+    Returns (paths in segment order, error messages, segments that were actually synthesized).
+    """
+    if not segments:
+        return [], [], []
+
+    results = [None] * len(segments)
+
+    # Group segments with identical (voice_id, text) so each pair is synthesized once
+    unique = {}
+    for i, segment in enumerate(segments):
+        unique.setdefault((segment["voice_id"], segment["text"]), []).append(i)
+
+    # Segments are independent network-bound calls, so run them concurrently
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(unique))) as executor:
+        futures = {
+            executor.submit(_generate_one, segments[indices[0]], out_dir, cache_dir): indices
+            for indices in unique.values()
+        }
+        for future in as_completed(futures):
+            first, *duplicates = futures[future]
+            try:
+                output_path, synthesized = future.result()
+            except Exception as e:
+                logger.error(str(e))
+                for i in (first, *duplicates):
+                    results[i] = e
+                continue
+
+            results[first] = (output_path, synthesized)
+            for i in duplicates:
+                if output_path:
+                    copy_path = os.path.join(out_dir, f"{secrets.token_hex(16)}.mp3")
+                    try:
+                        shutil.copyfile(output_path, copy_path)
+                    except OSError as e:
+                        # e.g. disk full - report this segment, keep collecting the rest
+                        logger.error(str(e))
+                        results[i] = e
+                        continue
+                    results[i] = (copy_path, False)
+                else:
+                    results[i] = (None, False)
+
+    # Collect in segment order
+    generated = []
+    errors = []
+    synthesized_segments = []
+
+    for i, result in enumerate(results):
+        if isinstance(result, Exception):
+            errors.append(f"Segment {i+1}: {str(result)}")
+            continue
+        output_path, synthesized = result
+        if output_path:
+            generated.append(output_path)
+            if synthesized:
+                synthesized_segments.append(segments[i])
+        else:
+            errors.append(f"Segment {i+1}: Generation failed")
+
+    return generated, errors, synthesized_segments
@@ -0,0 +1,11 @@
+-- Voice and generation counts for a user in a single round-trip
+create or replace function get_user_usage(uid uuid)
+returns json
+language sql
+stable
+as $$
+    select json_build_object(
+        'voices', (select count(*) from user_voices where user_id = uid),
+        'gens', (select count(*) from tts_generations where user_id = uid)
+    );
+$$;
@@ -0,0 +1,3 @@
+-- Timestamp rows server-side instead of in the client payload
+alter table user_voices alter column created_at set default now();
+alter table tts_generations alter column created_at set default now();
@@ -0,0 +1,12 @@
+-- Everything the sidebar and voice library need for a user in a single round-trip
+create or replace function get_user_dashboard(uid uuid)
+returns json
+language sql
+stable
+as $$
+    select json_build_object(
+        'voices', coalesce((select json_agg(v) from user_voices v where v.user_id = uid), '[]'::json),
+        'voice_count', (select count(*) from user_voices where user_id = uid),
+        'gens', (select count(*) from tts_generations where user_id = uid)
+    );
+$$;
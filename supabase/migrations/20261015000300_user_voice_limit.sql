@@ -0,0 +1,19 @@
+-- Enforce the per-user voice limit on insert so the client needs no count pre-check.
+-- Admins (user_roles.role = 'admin') are exempt. Keep in sync with MAX_VOICES_PER_USER.
+create or replace function enforce_user_voice_limit()
+returns trigger
+language plpgsql
+as $$
+begin
+    if not exists (select 1 from user_roles where user_id = new.user_id and role = 'admin')
+       and (select count(*) from user_voices where user_id = new.user_id) >= 1 then
+        raise exception 'voice limit reached' using errcode = 'check_violation';
+    end if;
+    return new;
+end;
+$$;
+
+drop trigger if exists user_voices_limit on user_voices;
+create trigger user_voices_limit
+    before insert on user_voices
+    for each row execute function enforce_user_voice_limit();
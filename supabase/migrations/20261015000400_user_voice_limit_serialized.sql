@@ -0,0 +1,28 @@
+-- Single source of truth for the voice limit; the app reads it via rpc('max_voices_per_user')
+create or replace function max_voices_per_user()
+returns integer
+language sql
+immutable
+as $$
+    select 1;
+$$;
+
+-- Serialize inserts per user before counting: under READ COMMITTED two concurrent
+-- inserts would otherwise both see the old count and both pass the check.
+create or replace function enforce_user_voice_limit()
+returns trigger
+language plpgsql
+as $$
+begin
+    if exists (select 1 from user_roles where user_id = new.user_id and role = 'admin') then
+        return new;
+    end if;
+
+    perform pg_advisory_xact_lock(hashtext('user_voices:' || new.user_id::text));
+
+    if (select count(*) from user_voices where user_id = new.user_id) >= max_voices_per_user() then
+        raise exception 'voice limit reached' using errcode = 'check_violation';
+    end if;
+    return new;
+end;
+$$;